@@ -3,46 +3,241 @@ Main application module for user management system.
 This module provides functionality for user registration and authentication.
 """
 
+import atexit
 import hashlib
+import hmac
+import os
+import pathlib
+import secrets
 import sqlite3
-from typing import Optional, Tuple
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, List, Optional, Tuple, Union
+
+
+# Connection-level tuning applied once when UserManager opens its connection.
+PRAGMAS = (
+    'PRAGMA journal_mode=WAL',
+    'PRAGMA synchronous=NORMAL',
+    'PRAGMA temp_store=MEMORY',
+    'PRAGMA cache_size=-2000',
+    'PRAGMA mmap_size=67108864',
+)
 
 
 class DatabaseConfig:
     """Database configuration constants."""
     DB_NAME = 'users.db'
     USERS_TABLE = 'users'
+    # Index SQLite creates for the UNIQUE constraint on users.username.
+    USERNAME_INDEX = 'sqlite_autoindex_users_1'
+    FETCH_BATCH_SIZE = 1000
+
+
+class HashConfig:
+    """Password hashing configuration constants."""
+    MIN_PASSWORD_LENGTH = 8
+    SALT_BYTES = 16
+    SCRYPT_N = 2 ** 14
+    SCRYPT_R = 8
+    SCRYPT_P = 1
+    DIGEST_BYTES = 32
+    # Accept unsalted SHA-256 hashes stored before scrypt was introduced.
+    ALLOW_LEGACY_SHA256 = True
+
+
+class CacheConfig:
+    """Credential lookup cache configuration constants."""
+    LOOKUP_MAXSIZE = 4096
+    # Seconds a cached row may be served before SQLite is consulted again,
+    # bounding staleness when other processes write to the same database.
+    LOOKUP_TTL = 60.0
+
+
+# SQL statements are built once at import so hot paths pass the same
+# string object to sqlite3 on every call.
+_SQL_INSERT = (
+    f'INSERT INTO {DatabaseConfig.USERS_TABLE} (username, password_hash, salt, email) '
+    f'VALUES (?, ?, ?, ?)'
+)
+_SQL_INSERT_OR_IGNORE = (
+    f'INSERT OR IGNORE INTO {DatabaseConfig.USERS_TABLE} (username, password_hash, salt, email) '
+    f'VALUES (?, ?, ?, ?)'
+)
+_SQL_SELECT_INDEX = "SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = ?"
+_SQL_SELECT_HASH = (
+    f'SELECT password_hash, salt FROM {DatabaseConfig.USERS_TABLE} '
+    f'INDEXED BY {DatabaseConfig.USERNAME_INDEX} WHERE username = ?'
+)
+_SQL_SELECT_INFO = f'SELECT id, username, email FROM {DatabaseConfig.USERS_TABLE} WHERE username = ?'
+_SQL_SELECT_ALL_INFO = f'SELECT id, username, email FROM {DatabaseConfig.USERS_TABLE} ORDER BY id'
+
+
+class _ThreadConnection:
+    """Owns one thread's read-only connection and closes it when the thread exits."""
+
+    __slots__ = ('conn', 'close', '__weakref__')
+
+    def __init__(self, conn: sqlite3.Connection):
+        """
+        Wrap a connection so it is closed once this holder is released.
+        
+        Args:
+            conn: Read-only connection opened for the current thread
+        """
+        self.conn = conn
+        self.close = weakref.finalize(self, conn.close)
 
 
 class UserManager:
-    """Manages user operations including registration and authentication."""
+    """
+    Manages user operations including registration and authentication.
+    
+    Each instance holds open database connections and is registered with
+    atexit until close() is called, so it stays alive for the rest of the
+    process otherwise. Callers that create short-lived instances (e.g. one
+    per request) must call close() when done.
+    """
+
+    __slots__ = (
+        'db_name',
+        '_conn',
+        '_write_lock',
+        '_tls',
+        '_read_uri',
+        '_read_conns',
+        '_read_conns_lock',
+        '_hash_cache',
+        '_hash_cache_lock',
+        '_closed',
+    )
 
     def __init__(self, db_name: str = DatabaseConfig.DB_NAME):
         """
         Initialize UserManager with database connection.
         
+        One read-write connection is opened here and used for all writes.
+        Reads go through a lazily opened read-only connection per thread so
+        concurrent lookups don't contend on a single connection; WAL lets
+        those readers run alongside the writer. A thread's read connection is
+        closed when the thread exits; the rest stay open until close().
+        
         Args:
             db_name: Name of the SQLite database file
+            
+        Raises:
+            DatabaseError: If the database cannot be opened or initialized
         """
         self.db_name = db_name
-        self._initialize_database()
+        self._hash_cache = OrderedDict()
+        self._hash_cache_lock = threading.Lock()
+        self._closed = False
+        # Serializes writes on the shared connection so a bulk transaction
+        # can't be joined or interrupted by writes from other threads.
+        self._write_lock = threading.Lock()
+        self._tls = threading.local()
+        self._read_conns = weakref.WeakSet()
+        self._read_conns_lock = threading.Lock()
+        # In-memory databases can't be shared across connections, so their
+        # reads stay on the main connection.
+        if db_name in (':memory:', ''):
+            self._read_uri = None
+        else:
+            self._read_uri = f"{pathlib.Path(db_name).resolve().as_uri()}?mode=ro"
+        try:
+            self._conn = sqlite3.connect(db_name, check_same_thread=False, isolation_level=None)
+        except sqlite3.Error as db_error:
+            raise DatabaseError(f"Failed to initialize database: {db_error}") from db_error
+        atexit.register(self.close)
+        try:
+            self._initialize_database()
+        except DatabaseError:
+            self.close()
+            raise
 
     def _initialize_database(self) -> None:
-        """Create users table if it doesn't exist."""
+        """Configure the connection and create users table if it doesn't exist."""
         try:
-            with sqlite3.connect(self.db_name) as conn:
-                cursor = conn.cursor()
-                cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS users (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        username TEXT UNIQUE NOT NULL,
-                        password_hash TEXT NOT NULL,
-                        email TEXT NOT NULL
-                    )
-                ''')
-                conn.commit()
+            for pragma in PRAGMAS:
+                self._conn.execute(pragma)
+            self._conn.execute('''
+                CREATE TABLE IF NOT EXISTS users (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    username TEXT UNIQUE NOT NULL,
+                    password_hash BLOB NOT NULL,
+                    salt BLOB,
+                    email TEXT NOT NULL
+                )
+            ''')
+            columns = {row[1] for row in self._conn.execute('PRAGMA table_info(users)')}
+            if 'salt' not in columns:
+                self._conn.execute('ALTER TABLE users ADD COLUMN salt BLOB')
+            username_index = self._conn.execute(
+                _SQL_SELECT_INDEX, (DatabaseConfig.USERNAME_INDEX,)
+            ).fetchone()
         except sqlite3.Error as db_error:
             raise DatabaseError(f"Failed to initialize database: {db_error}") from db_error
+        if username_index is None:
+            raise DatabaseError(
+                f"Failed to initialize database: missing index {DatabaseConfig.USERNAME_INDEX}"
+            )
+
+    def close(self) -> None:
+        """
+        Close all database connections. Safe to call more than once.
+        
+        This also drops the atexit registration made in __init__, which
+        otherwise keeps the instance alive until interpreter exit.
+        """
+        atexit.unregister(self.close)
+        # Stop serving cached credentials before the connections go away.
+        with self._hash_cache_lock:
+            self._closed = True
+            self._hash_cache.clear()
+        # Route later reads to the closed main connection so they fail
+        # instead of reopening a per-thread connection.
+        self._read_uri = None
+        with self._read_conns_lock:
+            for holder in list(self._read_conns):
+                holder.close()
+            self._read_conns.clear()
+        self._conn.close()
+
+    def _get_read_conn(self) -> sqlite3.Connection:
+        """
+        Return this thread's read-only connection, opening it on first use.
+        
+        Returns:
+            Connection to use for SELECT statements
+            
+        Raises:
+            sqlite3.Error: If the connection cannot be opened
+        """
+        holder = getattr(self._tls, 'holder', None)
+        if holder is not None:
+            return holder.conn
+        read_uri = self._read_uri
+        if read_uri is None:
+            return self._conn
+        
+        conn = sqlite3.connect(read_uri, uri=True, check_same_thread=False, isolation_level=None)
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        # Only the thread-local holds the holder strongly, so the connection
+        # is closed as soon as the thread exits.
+        holder = _ThreadConnection(conn)
+        with self._read_conns_lock:
+            # close() may have run while this connection was being opened;
+            # it has already swept _read_conns, so don't hand this one out.
+            if self._read_uri is None:
+                holder.close()
+                return self._conn
+            self._read_conns.add(holder)
+        self._tls.holder = holder
+        return conn
 
     def register_user(self, username: str, password: str, email: str) -> bool:
         """
@@ -63,29 +258,84 @@ class UserManager:
         if not username or not password or not email:
             raise ValueError("Username, password, and email are required")
         
-        if len(password) < 8:
-            raise ValueError("Password must be at least 8 characters long")
+        if len(password) < HashConfig.MIN_PASSWORD_LENGTH:
+            raise ValueError(
+                f"Password must be at least {HashConfig.MIN_PASSWORD_LENGTH} characters long"
+            )
         
-        password_hash = self._hash_password(password)
+        salt = secrets.token_bytes(HashConfig.SALT_BYTES)
+        password_hash = self._hash_password(password, salt)
         
         try:
-            with sqlite3.connect(self.db_name) as conn:
-                cursor = conn.cursor()
-                cursor.execute(
-                    f'INSERT INTO {DatabaseConfig.USERS_TABLE} (username, password_hash, email) VALUES (?, ?, ?)',
-                    (username, password_hash, email)
-                )
-                conn.commit()
-                return True
+            with self._write_lock:
+                self._conn.execute(_SQL_INSERT, (username, password_hash, salt, email))
         except sqlite3.IntegrityError:
             return False
         except sqlite3.Error as db_error:
             raise DatabaseError(f"Failed to register user: {db_error}") from db_error
+        
+        self._invalidate_lookup_cache(username)
+        return True
+
+    def register_users(self, rows: Iterable[Tuple[str, str, str]]) -> int:
+        """
+        Register many users at once, e.g. from an import script.
+        
+        All rows are validated before anything is written. Passwords are
+        hashed concurrently, then inserted with a single executemany inside
+        one transaction; usernames that already exist are skipped, matching
+        register_user returning False.
+        
+        Args:
+            rows: Iterable of (username, password, email) tuples
+            
+        Returns:
+            Number of users actually registered
+            
+        Raises:
+            DatabaseError: If database operation fails
+            ValueError: If input validation fails for any row
+        """
+        rows = list(rows)
+        for username, password, email in rows:
+            if not username or not password or not email:
+                raise ValueError("Username, password, and email are required")
+            if len(password) < HashConfig.MIN_PASSWORD_LENGTH:
+                raise ValueError(
+                    f"Password must be at least {HashConfig.MIN_PASSWORD_LENGTH} characters long"
+                )
+        
+        salts = [secrets.token_bytes(HashConfig.SALT_BYTES) for _ in rows]
+        password_hashes = self._hash_passwords_bulk([row[1] for row in rows], salts)
+        
+        try:
+            with self._write_lock, self._conn:
+                self._conn.execute('BEGIN')
+                cursor = self._conn.executemany(
+                    _SQL_INSERT_OR_IGNORE,
+                    (
+                        (username, password_hash, salt, email)
+                        for (username, _, email), password_hash, salt
+                        in zip(rows, password_hashes, salts)
+                    )
+                )
+        except sqlite3.Error as db_error:
+            raise DatabaseError(f"Failed to register users: {db_error}") from db_error
+        
+        self._invalidate_lookup_cache()
+        return cursor.rowcount
 
     def authenticate_user(self, username: str, password: str) -> bool:
         """
         Authenticate a user by username and password.
         
+        The stored row is looked up before any hashing, so unknown usernames
+        return without paying for a password hash. This makes misses faster
+        than wrong passwords, which reveals whether a username exists to a
+        caller able to time requests. Passwords shorter than
+        HashConfig.MIN_PASSWORD_LENGTH can never have been registered and
+        are rejected before any lookup.
+        
         Args:
             username: Username to authenticate
             password: Password to verify
@@ -96,27 +346,72 @@ class UserManager:
         Raises:
             DatabaseError: If database operation fails
         """
-        if not username or not password:
+        if not username or not password or len(password) < HashConfig.MIN_PASSWORD_LENGTH:
             return False
         
-        password_hash = self._hash_password(password)
-        
         try:
-            with sqlite3.connect(self.db_name) as conn:
-                cursor = conn.cursor()
-                cursor.execute(
-                    f'SELECT password_hash FROM {DatabaseConfig.USERS_TABLE} WHERE username = ?',
-                    (username,)
-                )
-                result = cursor.fetchone()
-                
-                if result is None:
-                    return False
-                
-                stored_hash = result[0]
-                return stored_hash == password_hash
+            result = self._lookup_hash(username)
         except sqlite3.Error as db_error:
             raise DatabaseError(f"Failed to authenticate user: {db_error}") from db_error
+        
+        if result is None:
+            return False
+        
+        stored_hash, salt = result
+        return self._verify_password(password, stored_hash, salt)
+
+    def _lookup_hash(self, username: str) -> Optional[Tuple[bytes, Optional[bytes]]]:
+        """
+        Fetch a user's stored hash and salt, serving repeats from a cache.
+        
+        The cache belongs to this instance, holds at most
+        CacheConfig.LOOKUP_MAXSIZE usernames in LRU order and expires entries
+        after CacheConfig.LOOKUP_TTL seconds. Only existing users are
+        cached; misses always go to SQLite so a user registered through
+        another instance or process is visible immediately. Once close() has
+        been called the cache is empty and is neither read nor filled.
+        
+        Args:
+            username: Username to look up
+            
+        Returns:
+            Tuple of (password_hash, salt) if found, None otherwise
+            
+        Raises:
+            sqlite3.Error: If the database query fails
+        """
+        now = time.monotonic()
+        with self._hash_cache_lock:
+            entry = None if self._closed else self._hash_cache.get(username)
+            if entry is not None and entry[0] > now:
+                self._hash_cache.move_to_end(username)
+                return entry[1]
+        
+        result = self._get_read_conn().execute(_SQL_SELECT_HASH, (username,)).fetchone()
+        if result is None:
+            return None
+        
+        with self._hash_cache_lock:
+            if self._closed:
+                return result
+            self._hash_cache[username] = (now + CacheConfig.LOOKUP_TTL, result)
+            self._hash_cache.move_to_end(username)
+            if len(self._hash_cache) > CacheConfig.LOOKUP_MAXSIZE:
+                self._hash_cache.popitem(last=False)
+        return result
+
+    def _invalidate_lookup_cache(self, username: Optional[str] = None) -> None:
+        """
+        Drop cached lookups for one username, or all of them.
+        
+        Args:
+            username: Username to forget; None clears the whole cache
+        """
+        with self._hash_cache_lock:
+            if username is None:
+                self._hash_cache.clear()
+            else:
+                self._hash_cache.pop(username, None)
 
     def get_user_info(self, username: str) -> Optional[Tuple[int, str, str]]:
         """
@@ -132,29 +427,112 @@ class UserManager:
             DatabaseError: If database operation fails
         """
         try:
-            with sqlite3.connect(self.db_name) as conn:
-                cursor = conn.cursor()
-                cursor.execute(
-                    f'SELECT id, username, email FROM {DatabaseConfig.USERS_TABLE} WHERE username = ?',
-                    (username,)
-                )
-                result = cursor.fetchone()
-                return result
+            return self._get_read_conn().execute(_SQL_SELECT_INFO, (username,)).fetchone()
         except sqlite3.Error as db_error:
             raise DatabaseError(f"Failed to retrieve user info: {db_error}") from db_error
 
+    def list_all_users(self) -> Tuple[List[int], List[str], List[str]]:
+        """
+        Retrieve every user as parallel column lists, e.g. for bulk export.
+        
+        Rows are fetched in batches of DatabaseConfig.FETCH_BATCH_SIZE and
+        split into one list per column, ordered by id.
+        
+        Returns:
+            Tuple of (ids, usernames, emails)
+            
+        Raises:
+            DatabaseError: If database operation fails
+        """
+        ids: List[int] = []
+        usernames: List[str] = []
+        emails: List[str] = []
+        try:
+            cursor = self._get_read_conn().execute(_SQL_SELECT_ALL_INFO)
+            cursor.arraysize = DatabaseConfig.FETCH_BATCH_SIZE
+            rows = cursor.fetchmany()
+            while rows:
+                for user_id, username, email in rows:
+                    ids.append(user_id)
+                    usernames.append(username)
+                    emails.append(email)
+                rows = cursor.fetchmany()
+            return ids, usernames, emails
+        except sqlite3.Error as db_error:
+            raise DatabaseError(f"Failed to list users: {db_error}") from db_error
+
     @staticmethod
-    def _hash_password(password: str) -> str:
+    def _hash_password(password: Union[str, bytes], salt: Optional[bytes] = None) -> bytes:
         """
-        Hash a password using SHA-256.
+        Hash a password using scrypt, or legacy SHA-256 when no salt is given.
         
         Args:
-            password: Plain text password
+            password: Plain text password, or its UTF-8 bytes if already encoded
+            salt: Per-user random salt; None selects the legacy SHA-256 hash
             
         Returns:
-            Hexadecimal hash string
+            Raw 32-byte digest
         """
-        return hashlib.sha256(password.encode()).hexdigest()
+        if isinstance(password, str):
+            password = password.encode('utf-8')
+        if salt is None:
+            return hashlib.sha256(password).digest()
+        return hashlib.scrypt(
+            password,
+            salt=salt,
+            n=HashConfig.SCRYPT_N,
+            r=HashConfig.SCRYPT_R,
+            p=HashConfig.SCRYPT_P,
+            dklen=HashConfig.DIGEST_BYTES
+        )
+
+    @staticmethod
+    def _hash_passwords_bulk(passwords: List[Union[str, bytes]], salts: List[bytes]) -> List[bytes]:
+        """
+        Hash many passwords, spreading the work across threads.
+        
+        hashlib.scrypt releases the GIL while it runs, so the hashes are
+        computed in parallel on multi-core machines. Workers are capped at
+        the CPU count: each scrypt call holds about 16 MiB, and extra
+        threads would add memory without adding throughput.
+        
+        Args:
+            passwords: Plain text passwords, as str or UTF-8 bytes
+            salts: Salt for each password, in the same order
+            
+        Returns:
+            Raw digests in the same order as the input
+        """
+        workers = min(len(passwords), os.cpu_count() or 1)
+        if workers < 2:
+            return [UserManager._hash_password(p, s) for p, s in zip(passwords, salts)]
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(UserManager._hash_password, passwords, salts))
+
+    @staticmethod
+    def _verify_password(password: Union[str, bytes], stored_hash, salt: Optional[bytes]) -> bool:
+        """
+        Check a password against a stored hash.
+        
+        Rows without a salt predate scrypt and are checked with SHA-256 when
+        HashConfig.ALLOW_LEGACY_SHA256 is enabled; very old rows hold the
+        digest as a hex string rather than raw bytes. Hashes are compared in
+        constant time.
+        
+        Args:
+            password: Plain text password, as str or UTF-8 bytes
+            stored_hash: Hash read from the database
+            salt: Salt read from the database, or None for legacy rows
+            
+        Returns:
+            True if the password matches, False otherwise
+        """
+        if salt is None and not HashConfig.ALLOW_LEGACY_SHA256:
+            return False
+        password_hash = UserManager._hash_password(password, salt)
+        if isinstance(stored_hash, str):
+            return hmac.compare_digest(stored_hash, password_hash.hex())
+        return hmac.compare_digest(stored_hash, password_hash)
 
 
 class DatabaseError(Exception):
@@ -188,6 +566,8 @@ def main() -> None:
             
     except (ValueError, DatabaseError) as error:
         print(f"Error occurred: {error}")
+    finally:
+        user_manager.close()
 
 
 if __name__ == "__main__":
@@ -6,8 +6,10 @@ import unittest
 import os
 import tempfile
 import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from unittest.mock import patch, MagicMock
-from app import UserManager, DatabaseError, DatabaseConfig
+from app import UserManager, DatabaseError, DatabaseConfig, HashConfig, CacheConfig, _SQL_SELECT_HASH
 
 
 class TestUserManager(unittest.TestCase):
@@ -23,6 +25,7 @@ class TestUserManager(unittest.TestCase):
     def tearDown(self):
         """Clean up after each test method."""
         # Ensure all connections are closed before deletion
+        self.user_manager.close()
         try:
             if os.path.exists(self.test_db_path):
                 os.unlink(self.test_db_path)
@@ -40,6 +43,130 @@ class TestUserManager(unittest.TestCase):
         result = self.user_manager.register_user("testuser", "different_pass", "other@example.com")
         self.assertFalse(result)
 
+    def test_register_users_bulk(self):
+        """Test bulk registration inserts all rows and they authenticate."""
+        rows = [(f"user{i}", f"password{i}xx", f"user{i}@example.com") for i in range(4)]
+        self.assertEqual(self.user_manager.register_users(rows), 4)
+        for username, password, _ in rows:
+            self.assertTrue(self.user_manager.authenticate_user(username, password))
+
+    @patch('os.cpu_count', return_value=2)
+    def test_hash_passwords_bulk_caps_workers_at_cpu_count(self, _mock_cpu_count):
+        """Test that bulk hashing never starts more threads than CPUs."""
+        salts = [bytes([i]) * HashConfig.SALT_BYTES for i in range(4)]
+        passwords = [f"password{i}" for i in range(4)]
+        with patch('app.ThreadPoolExecutor', wraps=ThreadPoolExecutor) as mock_executor:
+            hashes = UserManager._hash_passwords_bulk(passwords, salts)
+        mock_executor.assert_called_once_with(max_workers=2)
+        self.assertEqual(hashes, [UserManager._hash_password(p, s) for p, s in zip(passwords, salts)])
+
+    def test_register_users_skips_duplicates(self):
+        """Test that bulk registration skips usernames that already exist."""
+        self.user_manager.register_user("testuser", "password123", "test@example.com")
+        rows = [
+            ("testuser", "different_pass", "other@example.com"),
+            ("newuser", "password123", "new@example.com"),
+        ]
+        self.assertEqual(self.user_manager.register_users(rows), 1)
+        self.assertTrue(self.user_manager.authenticate_user("testuser", "password123"))
+
+    def test_register_users_duplicate_within_batch(self):
+        """Test that a username repeated within one batch is inserted once."""
+        rows = [
+            ("testuser", "password123", "test@example.com"),
+            ("testuser", "different_pass", "other@example.com"),
+        ]
+        self.assertEqual(self.user_manager.register_users(rows), 1)
+        self.assertTrue(self.user_manager.authenticate_user("testuser", "password123"))
+
+    def _block_in_batch(self, fail):
+        """
+        Return a value that pauses a bulk insert while SQLite adapts it.
+
+        The returned events report when the batch is inside its transaction
+        and let the test release it; with fail=True the batch then errors.
+        """
+        started = threading.Event()
+        release = threading.Event()
+
+        class BlockingEmail:
+            """Truthy email placeholder whose adaptation blocks."""
+
+        def adapt(_value):
+            started.set()
+            release.wait(5)
+            if fail:
+                raise sqlite3.OperationalError("batch failed")
+            return "blocked@example.com"
+
+        sqlite3.register_adapter(BlockingEmail, adapt)
+        self.addCleanup(sqlite3.adapters.pop, (BlockingEmail, sqlite3.PrepareProtocol), None)
+        return BlockingEmail(), started, release
+
+    def _run_in_thread(self, func, *args):
+        """Start func in a thread; the returned dict receives its result or error."""
+        outcome = {}
+
+        def target():
+            try:
+                outcome['result'] = func(*args)
+            except Exception as error:
+                outcome['error'] = error
+
+        thread = threading.Thread(target=target)
+        thread.start()
+        outcome['thread'] = thread
+        return outcome
+
+    def test_register_users_concurrent_batches(self):
+        """Test that two bulk registrations in different threads both commit."""
+        email, started, release = self._block_in_batch(fail=False)
+        first = self._run_in_thread(
+            self.user_manager.register_users, [("user1", "password123", email)]
+        )
+        self.assertTrue(started.wait(5))
+        second = self._run_in_thread(
+            self.user_manager.register_users, [("user2", "password123", "user2@example.com")]
+        )
+        second['thread'].join(0.2)
+        release.set()
+        first['thread'].join(5)
+        second['thread'].join(5)
+
+        self.assertEqual(first.get('result'), 1)
+        self.assertEqual(second.get('result'), 1)
+        self.assertIsNotNone(self.user_manager.get_user_info("user2"))
+
+    def test_register_user_not_lost_to_failed_batch(self):
+        """Test that a single insert is not rolled back with a concurrent failed batch."""
+        email, started, release = self._block_in_batch(fail=True)
+        batch = self._run_in_thread(
+            self.user_manager.register_users, [("user1", "password123", email)]
+        )
+        self.assertTrue(started.wait(5))
+        single = self._run_in_thread(
+            self.user_manager.register_user, "bob", "password123", "bob@example.com"
+        )
+        single['thread'].join(0.2)
+        release.set()
+        batch['thread'].join(5)
+        single['thread'].join(5)
+
+        self.assertIsInstance(batch.get('error'), DatabaseError)
+        self.assertTrue(single.get('result'))
+        self.assertIsNotNone(self.user_manager.get_user_info("bob"))
+        self.assertIsNone(self.user_manager.get_user_info("user1"))
+
+    def test_register_users_validates_before_insert(self):
+        """Test that an invalid row aborts bulk registration before any insert."""
+        rows = [
+            ("gooduser", "password123", "good@example.com"),
+            ("baduser", "short", "bad@example.com"),
+        ]
+        with self.assertRaises(ValueError):
+            self.user_manager.register_users(rows)
+        self.assertIsNone(self.user_manager.get_user_info("gooduser"))
+
     def test_register_user_empty_username(self):
         """Test that empty username raises ValueError."""
         with self.assertRaises(ValueError):
@@ -67,11 +194,62 @@ class TestUserManager(unittest.TestCase):
         result = self.user_manager.authenticate_user("testuser", "wrongpassword")
         self.assertFalse(result)
 
+    def test_authenticate_user_cached_lookup(self):
+        """Test that repeated authentication reuses the cached row."""
+        self.user_manager.register_user("testuser", "password123", "test@example.com")
+        self.assertTrue(self.user_manager.authenticate_user("testuser", "password123"))
+        self.user_manager._conn.execute('DELETE FROM users')
+        self.assertTrue(self.user_manager.authenticate_user("testuser", "password123"))
+
+    def test_authenticate_user_cache_expires(self):
+        """Test that cached rows are re-read once the TTL has elapsed."""
+        self.user_manager.register_user("testuser", "password123", "test@example.com")
+        with patch.object(CacheConfig, 'LOOKUP_TTL', 0.0):
+            self.assertTrue(self.user_manager.authenticate_user("testuser", "password123"))
+            self.user_manager._conn.execute('DELETE FROM users')
+            self.assertFalse(self.user_manager.authenticate_user("testuser", "password123"))
+
+    def test_authenticate_user_does_not_cache_misses(self):
+        """Test that a user registered through another instance is seen after a miss."""
+        self.assertFalse(self.user_manager.authenticate_user("testuser", "password123"))
+        self.assertNotIn("testuser", self.user_manager._hash_cache)
+        other_manager = UserManager(self.test_db_path)
+        try:
+            other_manager.register_user("testuser", "password123", "test@example.com")
+        finally:
+            other_manager.close()
+        self.assertTrue(self.user_manager.authenticate_user("testuser", "password123"))
+
+    def test_lookup_cache_is_bounded(self):
+        """Test that the lookup cache evicts least recently used entries."""
+        usernames = ("user1", "user2", "user3")
+        self.user_manager.register_users(
+            [(username, "password123", f"{username}@example.com") for username in usernames]
+        )
+        with patch.object(CacheConfig, 'LOOKUP_MAXSIZE', 2):
+            for username in usernames:
+                self.user_manager.authenticate_user(username, "password123")
+        self.assertEqual(list(self.user_manager._hash_cache), ["user2", "user3"])
+
     def test_authenticate_nonexistent_user(self):
         """Test that nonexistent user fails authentication."""
         result = self.user_manager.authenticate_user("nonexistent", "password123")
         self.assertFalse(result)
 
+    def test_authenticate_nonexistent_user_skips_hashing(self):
+        """Test that an unknown username is rejected without hashing."""
+        with patch.object(UserManager, '_hash_password') as mock_hash:
+            result = self.user_manager.authenticate_user("nonexistent", "password123")
+        self.assertFalse(result)
+        mock_hash.assert_not_called()
+
+    def test_authenticate_short_password_skips_lookup(self):
+        """Test that a too-short password is rejected before any database work."""
+        with patch.object(UserManager, '_lookup_hash') as mock_lookup:
+            result = self.user_manager.authenticate_user("testuser", "short")
+        self.assertFalse(result)
+        mock_lookup.assert_not_called()
+
     def test_authenticate_empty_username(self):
         """Test that empty username fails authentication."""
         result = self.user_manager.authenticate_user("", "password123")
@@ -91,12 +269,105 @@ class TestUserManager(unittest.TestCase):
         user_info = self.user_manager.get_user_info("nonexistent")
         self.assertIsNone(user_info)
 
+    def test_list_all_users(self):
+        """Test that all users are returned as parallel column lists."""
+        self.user_manager.register_user("testuser", "password123", "test@example.com")
+        self.user_manager.register_user("otheruser", "password123", "other@example.com")
+        ids, usernames, emails = self.user_manager.list_all_users()
+
+        self.assertEqual(len(ids), 2)
+        self.assertLess(ids[0], ids[1])
+        self.assertEqual(usernames, ["testuser", "otheruser"])
+        self.assertEqual(emails, ["test@example.com", "other@example.com"])
+
+    def test_list_all_users_spans_batches(self):
+        """Test that users beyond one fetch batch are all returned."""
+        rows = [(f"user{i}", "password123", f"user{i}@example.com") for i in range(5)]
+        self.user_manager.register_users(rows)
+        with patch.object(DatabaseConfig, 'FETCH_BATCH_SIZE', 2):
+            ids, usernames, emails = self.user_manager.list_all_users()
+        self.assertEqual(usernames, [row[0] for row in rows])
+        self.assertEqual(emails, [row[2] for row in rows])
+
+    def test_list_all_users_empty(self):
+        """Test that an empty table yields empty column lists."""
+        self.assertEqual(self.user_manager.list_all_users(), ([], [], []))
+
     def test_hash_password_consistency(self):
         """Test that password hashing is consistent."""
         hash1 = UserManager._hash_password("testpassword")
         hash2 = UserManager._hash_password("testpassword")
         self.assertEqual(hash1, hash2)
 
+    def test_hash_password_raw_digest(self):
+        """Test that password hashing returns the raw 32-byte SHA-256 digest."""
+        password_hash = UserManager._hash_password("testpassword")
+        self.assertIsInstance(password_hash, bytes)
+        self.assertEqual(len(password_hash), 32)
+
+    def test_hash_password_scrypt_uses_salt(self):
+        """Test that the same password hashes differently under different salts."""
+        hash1 = UserManager._hash_password("testpassword", b"a" * HashConfig.SALT_BYTES)
+        hash2 = UserManager._hash_password("testpassword", b"b" * HashConfig.SALT_BYTES)
+        self.assertEqual(len(hash1), HashConfig.DIGEST_BYTES)
+        self.assertNotEqual(hash1, hash2)
+
+    def test_register_user_stores_salt(self):
+        """Test that registration stores a per-user salt and scrypt hash."""
+        self.user_manager.register_user("testuser", "password123", "test@example.com")
+        self.user_manager.register_user("otheruser", "password123", "other@example.com")
+        rows = self.user_manager._conn.execute(
+            'SELECT password_hash, salt FROM users ORDER BY id'
+        ).fetchall()
+        self.assertEqual(len(rows[0][1]), HashConfig.SALT_BYTES)
+        self.assertNotEqual(rows[0][1], rows[1][1])
+        self.assertNotEqual(rows[0][0], rows[1][0])
+
+    def test_authenticate_legacy_sha256_user(self):
+        """Test that unsalted SHA-256 rows still authenticate."""
+        self.user_manager._conn.execute(
+            'INSERT INTO users (username, password_hash, email) VALUES (?, ?, ?)',
+            ("legacy", UserManager._hash_password("password123").hex(), "legacy@example.com")
+        )
+        self.assertTrue(self.user_manager.authenticate_user("legacy", "password123"))
+        self.assertFalse(self.user_manager.authenticate_user("legacy", "wrongpassword"))
+
+    @patch.object(HashConfig, 'ALLOW_LEGACY_SHA256', False)
+    def test_authenticate_legacy_sha256_user_disabled(self):
+        """Test that legacy rows are rejected when the legacy flag is off."""
+        self.user_manager._conn.execute(
+            'INSERT INTO users (username, password_hash, email) VALUES (?, ?, ?)',
+            ("legacy", UserManager._hash_password("password123"), "legacy@example.com")
+        )
+        self.assertFalse(self.user_manager.authenticate_user("legacy", "password123"))
+
+    def test_initialize_database_adds_salt_column(self):
+        """Test that an existing table without a salt column is migrated."""
+        self.user_manager.close()
+        os.unlink(self.test_db_path)
+        with sqlite3.connect(self.test_db_path) as conn:
+            conn.execute(
+                'CREATE TABLE users (id INTEGER PRIMARY KEY AUTOINCREMENT, '
+                'username TEXT UNIQUE NOT NULL, password_hash TEXT NOT NULL, email TEXT NOT NULL)'
+            )
+        conn.close()
+        self.user_manager = UserManager(self.test_db_path)
+        self.assertTrue(
+            self.user_manager.register_user("testuser", "password123", "test@example.com")
+        )
+
+    def test_hash_password_accepts_bytes(self):
+        """Test that pre-encoded passwords hash the same as their str form."""
+        salt = b"s" * HashConfig.SALT_BYTES
+        self.assertEqual(
+            UserManager._hash_password("pässword1", salt),
+            UserManager._hash_password("pässword1".encode('utf-8'), salt)
+        )
+        self.assertEqual(
+            UserManager._hash_password("password1"),
+            UserManager._hash_password(b"password1")
+        )
+
     def test_hash_password_different_inputs(self):
         """Test that different passwords produce different hashes."""
         hash1 = UserManager._hash_password("password1")
@@ -113,6 +384,127 @@ class TestUserManager(unittest.TestCase):
         result = self.user_manager.authenticate_user("testuser", "")
         self.assertFalse(result)
 
+    def test_initialize_database_pragmas(self):
+        """Test that the connection is configured for WAL with NORMAL sync."""
+        journal_mode = self.user_manager._conn.execute('PRAGMA journal_mode').fetchone()[0]
+        synchronous = self.user_manager._conn.execute('PRAGMA synchronous').fetchone()[0]
+        self.assertEqual(journal_mode, 'wal')
+        self.assertEqual(synchronous, 1)
+
+    def test_authenticate_lookup_uses_username_index(self):
+        """Test that the password hash lookup is served by the username index."""
+        plan = self.user_manager._conn.execute(
+            f'EXPLAIN QUERY PLAN {_SQL_SELECT_HASH}', ("testuser",)
+        ).fetchall()
+        self.assertIn('sqlite_autoindex_users_1', plan[0][-1])
+
+    def test_reads_use_per_thread_connections(self):
+        """Test that each thread reads through its own read-only connection."""
+        self.user_manager.register_user("testuser", "password123", "test@example.com")
+        main_conn = self.user_manager._get_read_conn()
+        results = {}
+
+        def worker():
+            results['conn'] = self.user_manager._get_read_conn()
+            results['info'] = self.user_manager.get_user_info("testuser")
+
+        thread = threading.Thread(target=worker)
+        thread.start()
+        thread.join()
+
+        self.assertIsNot(main_conn, self.user_manager._conn)
+        self.assertIsNot(results['conn'], main_conn)
+        self.assertEqual(results['info'][1], "testuser")
+        self.assertIs(self.user_manager._get_read_conn(), main_conn)
+
+    def test_read_connections_closed_when_threads_exit(self):
+        """Test that short-lived reader threads don't leave connections open."""
+        self.user_manager.register_user("testuser", "password123", "test@example.com")
+        thread_conns = []
+
+        def worker():
+            thread_conns.append(self.user_manager._get_read_conn())
+            self.user_manager.get_user_info("testuser")
+
+        for _ in range(50):
+            thread = threading.Thread(target=worker)
+            thread.start()
+            thread.join()
+
+        self.assertEqual(len(thread_conns), 50)
+        self.assertEqual(len(self.user_manager._read_conns), 0)
+        for conn in thread_conns:
+            with self.assertRaises(sqlite3.ProgrammingError):
+                conn.execute('SELECT 1')
+
+    def test_read_connection_opened_during_close_is_not_used(self):
+        """Test that a read racing close() fails instead of using a fresh connection."""
+        real_connect = sqlite3.connect
+        opened = []
+
+        def connect_then_close(*args, **kwargs):
+            conn = real_connect(*args, **kwargs)
+            opened.append(conn)
+            self.user_manager.close()
+            return conn
+
+        with patch('sqlite3.connect', side_effect=connect_then_close):
+            with self.assertRaises(DatabaseError):
+                self.user_manager.get_user_info("testuser")
+
+        self.assertEqual(len(opened), 1)
+        self.assertEqual(len(self.user_manager._read_conns), 0)
+        with self.assertRaises(sqlite3.ProgrammingError):
+            opened[0].execute('SELECT 1')
+
+    def test_read_connection_is_read_only(self):
+        """Test that the per-thread read connection rejects writes."""
+        with self.assertRaises(sqlite3.OperationalError):
+            self.user_manager._get_read_conn().execute('DELETE FROM users')
+
+    def test_in_memory_database(self):
+        """Test that an in-memory database serves reads from the main connection."""
+        user_manager = UserManager(':memory:')
+        try:
+            user_manager.register_user("testuser", "password123", "test@example.com")
+            self.assertTrue(user_manager.authenticate_user("testuser", "password123"))
+            self.assertIs(user_manager._get_read_conn(), user_manager._conn)
+        finally:
+            user_manager.close()
+
+    def test_user_manager_uses_slots(self):
+        """Test that UserManager instances have no per-instance __dict__."""
+        self.assertFalse(hasattr(self.user_manager, '__dict__'))
+        with self.assertRaises(AttributeError):
+            self.user_manager.unexpected_attribute = True
+
+    def test_in_memory_authenticate_after_close_raises(self):
+        """Test that a closed in-memory manager no longer serves cached users."""
+        user_manager = UserManager(':memory:')
+        user_manager.register_user("testuser", "password123", "test@example.com")
+        self.assertTrue(user_manager.authenticate_user("testuser", "password123"))
+        user_manager.close()
+        with self.assertRaises(DatabaseError):
+            user_manager.authenticate_user("testuser", "password123")
+
+    def test_close_is_idempotent(self):
+        """Test that closing the connection twice does not raise."""
+        self.user_manager.close()
+        self.user_manager.close()
+
+    def test_operation_after_close_raises(self):
+        """Test that using a closed UserManager raises DatabaseError."""
+        self.user_manager.register_user("testuser", "password123", "test@example.com")
+        self.assertTrue(self.user_manager.authenticate_user("testuser", "password123"))
+        self.user_manager.close()
+        self.assertEqual(len(self.user_manager._hash_cache), 0)
+        with self.assertRaises(DatabaseError):
+            self.user_manager.authenticate_user("testuser", "password123")
+        with self.assertRaises(DatabaseError):
+            self.user_manager.get_user_info("testuser")
+        with self.assertRaises(DatabaseError):
+            self.user_manager.register_user("testuser", "password123", "test@example.com")
+
     @patch('sqlite3.connect')
     def test_initialize_database_error(self, mock_connect):
         """Test database initialization error handling."""
@@ -120,54 +512,62 @@ class TestUserManager(unittest.TestCase):
         with self.assertRaises(DatabaseError):
             UserManager(self.test_db_path)
 
-    @patch('sqlite3.connect')
-    def test_register_user_database_error(self, mock_connect):
-        """Test database error during user registration."""
+    def test_initialize_database_failure_closes_connection(self):
+        """Test that a failed schema setup closes the connection and unregisters it."""
         mock_conn = MagicMock()
-        mock_cursor = MagicMock()
-        mock_cursor.execute.side_effect = sqlite3.Error("Database error")
-        mock_conn.cursor.return_value = mock_cursor
-        mock_conn.__enter__.return_value = mock_conn
-        mock_connect.return_value = mock_conn
-
-        user_manager = UserManager.__new__(UserManager)
-        user_manager.db_name = self.test_db_path
+        mock_conn.execute.side_effect = sqlite3.Error("Database error")
+        with patch('sqlite3.connect', return_value=mock_conn), \
+                patch('atexit.unregister') as mock_unregister:
+            with self.assertRaises(DatabaseError):
+                UserManager(self.test_db_path)
+        mock_conn.close.assert_called_once()
+        mock_unregister.assert_called_once()
+
+    def _make_failing_manager(self):
+        """Build a UserManager whose connection fails every statement."""
+        with patch('sqlite3.connect', return_value=MagicMock()):
+            user_manager = UserManager(self.test_db_path)
+        # Send reads through the mocked main connection too
+        user_manager._read_uri = None
+        user_manager._conn.execute.side_effect = sqlite3.Error("Database error")
+        user_manager._conn.executemany.side_effect = sqlite3.Error("Database error")
+        return user_manager
+
+    def test_register_user_database_error(self):
+        """Test database error during user registration."""
+        user_manager = self._make_failing_manager()
 
         with self.assertRaises(DatabaseError):
             user_manager.register_user("testuser", "password123", "test@example.com")
 
-    @patch('sqlite3.connect')
-    def test_authenticate_user_database_error(self, mock_connect):
-        """Test database error during user authentication."""
-        mock_conn = MagicMock()
-        mock_cursor = MagicMock()
-        mock_cursor.execute.side_effect = sqlite3.Error("Database error")
-        mock_conn.cursor.return_value = mock_cursor
-        mock_conn.__enter__.return_value = mock_conn
-        mock_connect.return_value = mock_conn
+    def test_register_users_database_error(self):
+        """Test database error during bulk user registration."""
+        user_manager = self._make_failing_manager()
 
-        user_manager = UserManager.__new__(UserManager)
-        user_manager.db_name = self.test_db_path
+        with self.assertRaises(DatabaseError):
+            user_manager.register_users([("testuser", "password123", "test@example.com")])
+
+    def test_authenticate_user_database_error(self):
+        """Test database error during user authentication."""
+        user_manager = self._make_failing_manager()
 
         with self.assertRaises(DatabaseError):
             user_manager.authenticate_user("testuser", "password123")
 
-    @patch('sqlite3.connect')
-    def test_get_user_info_database_error(self, mock_connect):
+    def test_get_user_info_database_error(self):
         """Test database error during get_user_info."""
-        mock_conn = MagicMock()
-        mock_cursor = MagicMock()
-        mock_cursor.execute.side_effect = sqlite3.Error("Database error")
-        mock_conn.cursor.return_value = mock_cursor
-        mock_conn.__enter__.return_value = mock_conn
-        mock_connect.return_value = mock_conn
-
-        user_manager = UserManager.__new__(UserManager)
-        user_manager.db_name = self.test_db_path
+        user_manager = self._make_failing_manager()
 
         with self.assertRaises(DatabaseError):
             user_manager.get_user_info("testuser")
 
+    def test_list_all_users_database_error(self):
+        """Test database error during list_all_users."""
+        user_manager = self._make_failing_manager()
+
+        with self.assertRaises(DatabaseError):
+            user_manager.list_all_users()
+
 
 class TestDatabaseConfig(unittest.TestCase):
     """Test cases for DatabaseConfig class."""
@@ -176,6 +576,8 @@ class TestDatabaseConfig(unittest.TestCase):
         """Test that DatabaseConfig has the correct constants."""
         self.assertEqual(DatabaseConfig.DB_NAME, 'users.db')
         self.assertEqual(DatabaseConfig.USERS_TABLE, 'users')
+        self.assertEqual(DatabaseConfig.USERNAME_INDEX, 'sqlite_autoindex_users_1')
+        self.assertEqual(DatabaseConfig.FETCH_BATCH_SIZE, 1000)
 
 
 class TestDatabaseError(unittest.TestCase):